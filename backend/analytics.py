@@ -0,0 +1,167 @@
+"""
+Per-post view / like / comment counts, aggregated in memory and rolled up
+into hourly and daily tables.
+
+Requests only bump an in-process counter keyed by (post, hour). Every
+FLUSH_INTERVAL_SECONDS (and on shutdown) the counters are swapped out and
+written as one batch of upserts adding to post_stats_hourly and
+post_stats_daily, so the number of rows written per flush depends on how many
+posts were active, not on how much traffic they got. Counts a worker hasn't
+flushed yet are not visible in /posts/{id}/stats.
+
+Hourly rows older than HOURLY_RETENTION_DAYS are pruned; daily rows are kept.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from database import SessionLocal, insert_or_add
+from models import PostStatsDaily, PostStatsHourly
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("views", "likes", "comments")
+FLUSH_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", 60))
+HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", 14))
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def utc_naive(value: datetime) -> datetime:
+    """Rollup buckets are stored as naive UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class ActivityCounter:
+    def __init__(self):
+        self._pending: Dict[Tuple[int, datetime], List[int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = float("-inf")
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, post_id: int, metric: str = "views", amount: int = 1):
+        key = (post_id, _hour(datetime.utcnow()))
+        index = METRICS.index(metric)
+        with self._lock:
+            counts = self._pending.get(key)
+            if counts is None:
+                counts = self._pending[key] = [0] * len(METRICS)
+            counts[index] += amount
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, counts in pending.items():
+                current = self._pending.setdefault(key, [0] * len(METRICS))
+                for i, count in enumerate(counts):
+                    current[i] += count
+
+    def flush(self):
+        """Write pending counts as one batch of upserts; counts are kept if the write fails."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if pending:
+                hourly = [
+                    {"post_id": post_id, "bucket": hour, **dict(zip(METRICS, counts))}
+                    for (post_id, hour), counts in pending.items()
+                ]
+                daily: Dict[Tuple[int, date], List[int]] = {}
+                for (post_id, hour), counts in pending.items():
+                    totals = daily.setdefault((post_id, hour.date()), [0] * len(METRICS))
+                    for i, count in enumerate(counts):
+                        totals[i] += count
+                try:
+                    with SessionLocal() as db:
+                        insert_or_add(db, PostStatsHourly, ("post_id", "bucket"), METRICS, hourly)
+                        insert_or_add(db, PostStatsDaily, ("post_id", "bucket"), METRICS, [
+                            {"post_id": post_id, "bucket": day, **dict(zip(METRICS, counts))}
+                            for (post_id, day), counts in daily.items()
+                        ])
+                        db.commit()
+                except Exception:
+                    self._restore(pending)
+                    raise
+            if time.monotonic() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+                self._last_prune = time.monotonic()
+                self.prune()
+
+    def prune(self):
+        cutoff = _hour(datetime.utcnow()) - timedelta(days=HOURLY_RETENTION_DAYS)
+        with SessionLocal() as db:
+            db.query(PostStatsHourly).filter(PostStatsHourly.bucket < cutoff).delete(synchronize_session=False)
+            db.commit()
+
+    def _run(self):
+        while not self._stop.wait(FLUSH_INTERVAL_SECONDS):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not flush post analytics")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="analytics-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+counter = ActivityCounter()
+
+
+def post_stats(db, post_id: int, start: datetime, end: datetime, granularity: str = "day") -> dict:
+    """Totals and per-bucket counts for `post_id` over [start, end), from the rollup tables.
+
+    With day granularity every day overlapping the range is included.
+    """
+    start, end = utc_naive(start), utc_naive(end)
+    if granularity == "hour":
+        model = PostStatsHourly
+        bounds = (model.bucket >= _hour(start), model.bucket < end)
+    else:
+        model = PostStatsDaily
+        bounds = (model.bucket >= start.date(), model.bucket <= (end - timedelta(microseconds=1)).date())
+    rows = (
+        db.query(model.bucket, *[getattr(model, metric) for metric in METRICS])
+        .filter(model.post_id == post_id, *bounds)
+        .order_by(model.bucket)
+        .all()
+    )
+    buckets = [
+        {
+            "start": bucket if isinstance(bucket, datetime) else datetime.combine(bucket, dt_time()),
+            **dict(zip(METRICS, counts))
+        }
+        for bucket, *counts in rows
+    ]
+    totals = {metric: sum(bucket[metric] for bucket in buckets) for metric in METRICS}
+    return {
+        "post_id": post_id,
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        **totals,
+        "buckets": buckets,
+    }
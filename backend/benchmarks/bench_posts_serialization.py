@@ -0,0 +1,83 @@
+"""
+Benchmark: cost of serializing one /posts/ page.
+
+Compares the old path (PostListResponse validation + FastAPI's jsonable_encoder
++ stdlib json) against the orjson fast path, and reports wire size with gzip
+and brotli.
+
+    cd backend && python benchmarks/bench_posts_serialization.py [page_size] [content_chars]
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from compression import brotli, compress
+from schemas import PostListResponse
+
+
+def make_page(page_size: int, content_chars: int) -> dict:
+    paragraph = "Sunrise over the terraced rice fields, then a long ride north. "
+    content = (paragraph * (content_chars // len(paragraph) + 1))[:content_chars]
+    posts = [
+        {
+            "id": i,
+            "title": f"Travel diary day {i}",
+            "content": content,
+            "description": "A short description of the trip",
+            "author": "WanderLuxe",
+            "image": f"/uploads/{i:08d}.jpg",
+            "created_at": datetime(2024, 5, 1, 12, 30, i % 60),
+            "updated_at": None,
+            "likes": i * 3,
+            "comments": i % 7,
+            "owner_id": 1,
+            # Derived fields stored with each post (content_html is detail-only)
+            "excerpt": content[:277] + "...",
+            "word_count": len(content.split()),
+            "reading_time": max(1, len(content.split()) // 200),
+        }
+        for i in range(page_size)
+    ]
+    return {"posts": posts, "total": 1000, "has_more": True}
+
+
+def pydantic_path(page: dict) -> bytes:
+    model = PostListResponse(**page)
+    return json.dumps(jsonable_encoder(model), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_path(page: dict) -> bytes:
+    return orjson.dumps(page)
+
+
+def main():
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    content_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    page = make_page(page_size, content_chars)
+    rounds = 500
+
+    print(f"page_size={page_size} content_chars={content_chars} rounds={rounds}")
+    for name, fn in (("pydantic+json", pydantic_path), ("orjson", orjson_path)):
+        seconds = min(timeit.repeat(lambda: fn(page), number=rounds, repeat=3)) / rounds
+        print(f"  {name:<14} {seconds * 1e6:9.1f} us/request")
+
+    body = orjson_path(page)
+    print(f"  identity       {len(body):9d} bytes")
+    for encoding in ("gzip", "br"):
+        if encoding == "br" and brotli is None:
+            print("  br             (brotli not installed)")
+            continue
+        seconds = min(timeit.repeat(lambda: compress(body, encoding), number=50, repeat=3)) / 50
+        size = len(compress(body, encoding))
+        print(f"  {encoding:<14} {size:9d} bytes ({size / len(body):.1%}), {seconds * 1e6:.1f} us to compress")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: read throughput of `gunicorn main:app` as the worker count grows.
+
+Starts the server with 1, 2, ... up to the number of cores, drives
+GET /posts/ and GET /posts/{id} from client threads, and prints requests/sec.
+
+    cd backend && python benchmarks/bench_workers.py [seconds_per_run] [client_threads]
+"""
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PORT = 8765
+
+
+def wait_ready(timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def drive(seconds: float, threads: int) -> float:
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+
+    def client(index: int):
+        conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=10)
+        paths = ("/posts/", "/posts/1")
+        while time.monotonic() < deadline:
+            conn.request("GET", paths[counts[index] % 2])
+            conn.getresponse().read()
+            counts[index] += 1
+
+    pool = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    cores = multiprocessing.cpu_count()
+    worker_counts = sorted({1, 2, cores // 2, cores} - {0})
+
+    env = dict(
+        os.environ,
+        PORT=str(PORT),
+        # Keep admission control out of the measurement
+        MAX_CONCURRENT_REQUESTS="0",
+    )
+    baseline = None
+    for workers in worker_counts:
+        env["WEB_CONCURRENCY"] = str(workers)
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "main:app"], cwd=BACKEND_DIR, env=env)
+        try:
+            wait_ready()
+            rps = drive(seconds, threads)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        baseline = baseline or rps
+        print(f"workers={workers:<3} {rps:9.0f} req/s  ({rps / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Response compression (brotli when available, otherwise gzip).
+
+Only complete, single-message responses are compressed; streamed bodies,
+partial (206) responses and responses that already carry a Content-Encoding
+pass through untouched. /uploads is skipped entirely: CachedStaticFiles serves
+precompressed siblings there itself.
+"""
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip covers every client anyway
+    brotli = None
+
+# Served by CachedStaticFiles, which negotiates .br / .gz siblings itself
+SKIP_PATH_PREFIXES = ("/uploads/",)
+
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"application/xml",
+    b"application/atom+xml",
+    b"application/rss+xml",
+    b"application/x-ndjson",
+    b"text/",
+    b"image/svg+xml",
+)
+
+
+def _quality(params) -> float:
+    for param in params:
+        name, _, value = param.partition(b"=")
+        if name.strip().lower() == b"q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_encoding(accept_encoding: bytes, coding: bytes) -> bool:
+    """Whether an Accept-Encoding value allows `coding` (q=0 means "not acceptable")."""
+    qualities = {}
+    for part in accept_encoding.split(b","):
+        name, *params = part.split(b";")
+        qualities[name.strip().lower()] = _quality(params)
+    # "*" covers codings that aren't listed explicitly
+    return qualities.get(coding, qualities.get(b"*", 0.0)) > 0
+
+
+def _accepted_encoding(scope):
+    for name, value in scope.get("headers") or []:
+        if name == b"accept-encoding":
+            if brotli is not None and accepts_encoding(value, b"br"):
+                return "br"
+            if accepts_encoding(value, b"gzip"):
+                return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing JSON / text responses above a size threshold."""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = _accepted_encoding(scope)
+        if encoding is None or scope["path"].startswith(SKIP_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            headers = dict(start_message.get("headers") or [])
+            content_type = headers.get(b"content-type", b"")
+            body = message.get("body", b"")
+            if (
+                message.get("more_body")
+                or start_message["status"] == 206
+                or b"content-range" in headers
+                or b"content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            new_headers = [
+                (name, value) for name, value in start_message.get("headers") or []
+                if name not in (b"content-length", b"vary", b"etag")
+            ]
+            etag = headers.get(b"etag")
+            if etag:
+                # Encoded bytes differ from the identity representation
+                new_headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            vary = headers.get(b"vary")
+            new_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+            new_headers.append((b"content-encoding", encoding.encode()))
+            new_headers.append((b"content-length", str(len(compressed)).encode()))
+            await send({**start_message, "headers": new_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,11 +1,81 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, defer
 from sqlalchemy import func
 from typing import List, Optional
-from models import Post, User, Comment, Appointment
+from models import Post, User, Comment, Appointment, UserStats
 from schemas import PostCreate, PostUpdate, CommentCreate, AppointmentCreate
+from database import insert_or_add
+from invalidation import publish
+from rendering import render_post_content
 
-def get_posts(db: Session, skip: int = 0, limit: int = 10, search: str = ""):
-    """Get posts with pagination and search"""
+def _bump_user_stats(db: Session, user_id: int, posts: int = 0, likes: int = 0, comments: int = 0):
+    """Apply deltas to a user's aggregate row inside the caller's transaction"""
+    insert_or_add(
+        db, UserStats, ("user_id",), ("post_count", "total_likes", "total_comments"),
+        [{"user_id": user_id, "post_count": posts, "total_likes": likes, "total_comments": comments}]
+    )
+
+def _bump_post_counters(db: Session, post_id: int, **deltas: int):
+    """Adjust a post's like/comment counters in place, leaving updated_at alone
+
+    updated_at tracks content edits; feeds and incremental exports key off it.
+    """
+    values = {getattr(Post, name): getattr(Post, name) + delta for name, delta in deltas.items()}
+    values[Post.updated_at] = Post.updated_at
+    db.query(Post).filter(Post.id == post_id).update(values, synchronize_session=False)
+
+def rebuild_user_stats(db: Session):
+    """Recompute every user's aggregates from posts (backfill / repair)"""
+    rows = db.query(
+        Post.owner_id,
+        func.count(Post.id),
+        func.coalesce(func.sum(Post.likes), 0),
+        func.coalesce(func.sum(Post.comments), 0)
+    ).group_by(Post.owner_id).all()
+    db.query(UserStats).delete(synchronize_session=False)
+    db.add_all([
+        UserStats(user_id=owner_id, post_count=count, total_likes=likes, total_comments=comments)
+        for owner_id, count, likes, comments in rows
+    ])
+    db.commit()
+
+def get_user_stats(db: Session, user_id: int) -> dict:
+    """Get a user's precomputed aggregates (zeros if they have never posted)"""
+    stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    return {
+        "user_id": user_id,
+        "post_count": stats.post_count if stats else 0,
+        "total_likes": stats.total_likes if stats else 0,
+        "total_comments": stats.total_comments if stats else 0
+    }
+
+def post_to_dict(post: Post, summary: bool = False, html: bool = True) -> dict:
+    """Plain dict with the PostResponse (or PostSummary) fields, ready for direct JSON serialization
+
+    `html=False` leaves out content_html, which only the single-post page renders.
+    """
+    data = {
+        "id": post.id,
+        "title": post.title,
+        "description": post.description,
+        "author": post.author,
+        "image": post.image,
+        "created_at": post.created_at,
+        "updated_at": post.updated_at,
+        "likes": post.likes,
+        "comments": post.comments,
+        "owner_id": post.owner_id,
+        "excerpt": post.excerpt,
+        "word_count": post.word_count,
+        "reading_time": post.reading_time
+    }
+    if not summary:
+        data["content"] = post.content
+        if html:
+            data["content_html"] = post.content_html
+    return data
+
+def get_posts(db: Session, skip: int = 0, limit: int = 10, search: str = "", summary: bool = False):
+    """Get posts with pagination and search (`summary` leaves out the post bodies)"""
     query = db.query(Post)
     
     if search:
@@ -16,28 +86,15 @@ def get_posts(db: Session, skip: int = 0, limit: int = 10, search: str = ""):
         )
     
     total = query.count()
+    # Lists never carry content_html (detail endpoint only); summaries skip the body too
+    query = query.options(defer(Post.content_html))
+    if summary:
+        query = query.options(defer(Post.content))
     posts = query.offset(skip).limit(limit).all()
     has_more = skip + limit < total
     
-    # Convert SQLAlchemy models to dictionaries for Pydantic v2
-    posts_dict = []
-    for post in posts:
-        posts_dict.append({
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "description": post.description,
-            "author": post.author,
-            "image": post.image,
-            "created_at": post.created_at,
-            "updated_at": post.updated_at,
-            "likes": post.likes,
-            "comments": post.comments,
-            "owner_id": post.owner_id
-        })
-    
     return {
-        "posts": posts_dict,
+        "posts": [post_to_dict(post, summary=summary, html=False) for post in posts],
         "total": total,
         "has_more": has_more
     }
@@ -46,21 +103,19 @@ def get_post(db: Session, post_id: int) -> Optional[dict]:
     """Get a single post by ID"""
     post = db.query(Post).filter(Post.id == post_id).first()
     if post:
-        return {
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "description": post.description,
-            "author": post.author,
-            "image": post.image,
-            "created_at": post.created_at,
-            "updated_at": post.updated_at,
-            "likes": post.likes,
-            "comments": post.comments,
-            "owner_id": post.owner_id
-        }
+        return post_to_dict(post)
     return None
 
+def get_posts_by_ids(db: Session, post_ids: List[int]) -> dict:
+    """Get several posts in one query, in the requested order"""
+    unique_ids = list(dict.fromkeys(post_ids))
+    rows = db.query(Post).filter(Post.id.in_(unique_ids)).all() if unique_ids else []
+    by_id = {post.id: post for post in rows}
+    return {
+        "posts": [post_to_dict(by_id[post_id]) for post_id in unique_ids if post_id in by_id],
+        "missing": [post_id for post_id in unique_ids if post_id not in by_id]
+    }
+
 def create_post(db: Session, post: PostCreate, owner_id: int) -> Post:
     """Create a new post"""
     db_post = Post(
@@ -69,11 +124,14 @@ def create_post(db: Session, post: PostCreate, owner_id: int) -> Post:
         description=post.description,
         image=post.image,
         author=post.author,
-        owner_id=owner_id
+        owner_id=owner_id,
+        **render_post_content(post.content)
     )
     db.add(db_post)
+    _bump_user_stats(db, owner_id, posts=1)
     db.commit()
     db.refresh(db_post)
+    publish("post", db_post.id)
     return db_post
 
 def update_post(db: Session, post_id: int, post: PostUpdate, owner_id: int) -> Optional[Post]:
@@ -83,11 +141,14 @@ def update_post(db: Session, post_id: int, post: PostUpdate, owner_id: int) -> O
         return None
     
     update_data = post.dict(exclude_unset=True)
+    if update_data.get("content") is not None:
+        update_data.update(render_post_content(update_data["content"]))
     for field, value in update_data.items():
         setattr(db_post, field, value)
     
     db.commit()
     db.refresh(db_post)
+    publish("post", post_id)
     return db_post
 
 def delete_post(db: Session, post_id: int, owner_id: int) -> bool:
@@ -96,8 +157,10 @@ def delete_post(db: Session, post_id: int, owner_id: int) -> bool:
     if not db_post:
         return False
     
+    _bump_user_stats(db, owner_id, posts=-1, likes=-(db_post.likes or 0), comments=-(db_post.comments or 0))
     db.delete(db_post)
     db.commit()
+    publish("post", post_id)
     return True
 
 def like_post(db: Session, post_id: int) -> Optional[Post]:
@@ -106,14 +169,25 @@ def like_post(db: Session, post_id: int) -> Optional[Post]:
     if not db_post:
         return None
     
-    db_post.likes += 1
+    _bump_post_counters(db, post_id, likes=1)
+    _bump_user_stats(db, db_post.owner_id, likes=1)
     db.commit()
     db.refresh(db_post)
+    publish("post", post_id)
     return db_post
 
-def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10) -> List[Post]:
-    """Get posts by a specific user"""
-    return db.query(Post).filter(Post.owner_id == user_id).offset(skip).limit(limit).all()
+def get_user_posts(db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 10) -> dict:
+    """Get a user's posts, newest first, starting after the `before_id` cursor"""
+    query = db.query(Post).filter(Post.owner_id == user_id)
+    if before_id is not None:
+        query = query.filter(Post.id < before_id)
+    # One extra row tells us whether another page exists, without a count
+    posts = query.options(defer(Post.content_html)).order_by(Post.id.desc()).limit(limit + 1).all()
+    next_cursor = str(posts[limit - 1].id) if len(posts) > limit else None
+    return {
+        "posts": [post_to_dict(post, html=False) for post in posts[:limit]],
+        "next_cursor": next_cursor
+    }
 
 # Comment CRUD operations
 def get_comments(db: Session, post_id: int, skip: int = 0, limit: int = 10):
@@ -143,10 +217,12 @@ def create_comment(db: Session, comment: CommentCreate, post_id: int, user_id: i
     # Update post comments count
     db_post = db.query(Post).filter(Post.id == post_id).first()
     if db_post:
-        db_post.comments += 1
+        _bump_post_counters(db, post_id, comments=1)
+        _bump_user_stats(db, db_post.owner_id, comments=1)
     
     db.commit()
     db.refresh(db_comment)
+    publish("post", post_id)
     return db_comment
 
 def delete_comment(db: Session, comment_id: int, user_id: int) -> bool:
@@ -158,10 +234,12 @@ def delete_comment(db: Session, comment_id: int, user_id: int) -> bool:
     # Update post comments count
     db_post = db.query(Post).filter(Post.id == db_comment.post_id).first()
     if db_post and db_post.comments > 0:
-        db_post.comments -= 1
+        _bump_post_counters(db, db_post.id, comments=-1)
+        _bump_user_stats(db, db_post.owner_id, comments=-1)
     
     db.delete(db_comment)
     db.commit()
+    publish("post", db_comment.post_id)
     return True
 
 
@@ -1,7 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+from profiling import instrument_engine, phase
 
 # Database URL - from .env or default SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./blog.db")
@@ -14,16 +15,62 @@ if DATABASE_URL.startswith("sqlite"):
 # Create SQLAlchemy engine
 engine = create_engine(DATABASE_URL, connect_args=connect_args)
 
+# Count SQL time towards the Server-Timing db phase
+instrument_engine(engine)
+
+# Workers forked from a preloaded app must open their own connections
+os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
 
+def add_missing_columns(table):
+    """Add columns defined on the model but missing from an existing table (create_all won't)"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def insert_or_add(db, model, keys, counters, rows):
+    """Batched upsert: insert `rows`, or add their `counters` onto the existing row with the same `keys`.
+
+    A single INSERT ... ON CONFLICT DO UPDATE on SQLite / PostgreSQL, so
+    concurrent writers (other threads or workers) can't race each other into
+    an IntegrityError. Runs inside the caller's transaction.
+    """
+    if engine.dialect.name in ("sqlite", "postgresql"):
+        if engine.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model)
+        set_ = {name: getattr(model, name) + getattr(stmt.excluded, name) for name in counters}
+        # ON CONFLICT DO UPDATE doesn't apply Column(onupdate=...) by itself
+        for column in model.__table__.columns:
+            if column.onupdate is not None and column.onupdate.is_clause_element:
+                set_[column.name] = column.onupdate.arg
+        stmt = stmt.on_conflict_do_update(index_elements=[getattr(model, key) for key in keys], set_=set_)
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        existing = db.get(model, tuple(row[key] for key in keys))
+        if existing is None:
+            db.add(model(**row))
+        else:
+            for name in counters:
+                setattr(existing, name, getattr(existing, name) + row[name])
+
 # Dependency to get database session
 def get_db():
-    db = SessionLocal()
+    with phase("db"):
+        db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        with phase("db"):
+            db.close()
@@ -0,0 +1,150 @@
+"""
+Streaming exports of posts, comments and appointments as NDJSON or CSV.
+
+Rows are read with a server-side cursor (yield_per) and encoded in ~64 KB
+chunks, optionally gzip-compressed on the fly, so memory stays flat however
+many rows are exported. Used by the /export endpoints and from the command line:
+
+    python export.py posts --format csv --gzip --updated-since 2024-01-01 -o posts.csv.gz
+"""
+import argparse
+import csv
+import io
+import sys
+import zlib
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+import orjson
+from sqlalchemy import func, select
+
+from database import SessionLocal
+from models import Appointment, Comment, Post
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+
+EXPORTS = {
+    "posts": (
+        Post,
+        ("id", "title", "content", "description", "image", "author", "likes", "comments",
+         "owner_id", "created_at", "updated_at"),
+    ),
+    "comments": (Comment, ("id", "post_id", "user_id", "author", "content", "created_at")),
+    "appointments": (
+        Appointment,
+        ("id", "full_name", "email", "phone", "appointment_date", "appointment_time", "service_type",
+         "notes", "status", "user_id", "created_at"),
+    ),
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_rows(db, table: str, updated_since: Optional[datetime] = None) -> Iterator[dict]:
+    """Yield rows of `table` as dicts, oldest first, fetched BATCH_SIZE at a time."""
+    model, columns = EXPORTS[table]
+    query = select(*[getattr(model, column) for column in columns]).order_by(model.id)
+    if updated_since is not None:
+        changed_at = model.created_at
+        if hasattr(model, "updated_at"):
+            changed_at = func.coalesce(model.updated_at, model.created_at)
+        query = query.where(changed_at >= updated_since)
+    result = db.execute(query.execution_options(yield_per=BATCH_SIZE))
+    for row in result.mappings():
+        yield dict(row)
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def encode_ndjson(rows: Iterable[dict]) -> Iterator[bytes]:
+    for row in rows:
+        yield orjson.dumps(row) + b"\n"
+
+
+def encode_csv(rows: Iterable[dict], columns) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunked(pieces: Iterable[bytes], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Coalesce small pieces into chunks of roughly `size` bytes."""
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(
+    table: str,
+    fmt: str = "ndjson",
+    gzip: bool = False,
+    updated_since: Optional[datetime] = None,
+) -> Iterator[bytes]:
+    """Encoded export of `table`. Opens its own session, so it can outlive the request's."""
+    db = SessionLocal()
+    try:
+        rows = iter_rows(db, table, updated_since)
+        if fmt == "csv":
+            pieces = encode_csv(rows, EXPORTS[table][1])
+        else:
+            pieces = encode_ndjson(rows)
+        chunks = chunked(pieces)
+        if gzip:
+            chunks = gzipped(chunks)
+        yield from chunks
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export posts, comments or appointments")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("--updated-since", type=datetime.fromisoformat, help="ISO date/time; only newer rows")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(args.table, args.format, args.gzip, args.updated_since):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Production serving config, picked up automatically by `gunicorn main:app`.
+
+The app is imported once in the master (preload) and forked into uvicorn
+workers, so startup work such as create_all runs once and workers share
+pages copy-on-write. Each worker recycles after roughly MAX_REQUESTS requests.
+`kill -HUP <master>` reloads workers gracefully; SIGTERM drains in-flight
+requests for up to GRACEFUL_TIMEOUT seconds.
+"""
+import multiprocessing
+import os
+
+host = "0.0.0.0" if os.environ.get("RENDER") else "127.0.0.1"
+bind = f"{host}:{os.environ.get('PORT', 8000)}"
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+max_requests = int(os.environ.get("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", max_requests // 10))
+
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+keepalive = 5
+
+accesslog = os.environ.get("ACCESS_LOG")
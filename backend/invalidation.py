@@ -0,0 +1,174 @@
+"""
+Cross-worker cache invalidation.
+
+With several worker processes each holding its own in-memory caches, a write
+handled by one worker has to evict stale entries in all the others. publish()
+appends an event to a small SQLite table (INVALIDATION_PATH) and applies it
+locally right away; a background thread in every process tails the table and
+hands new events to the subscribers of that topic. Other workers therefore
+converge within POLL_INTERVAL_SECONDS.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_PATH = os.getenv("INVALIDATION_PATH", "invalidation.db")
+POLL_INTERVAL_SECONDS = float(os.getenv("INVALIDATION_POLL_SECONDS", 0.5))
+RETENTION_SECONDS = 3600
+
+_subscribers: Dict[str, List[Callable[[str], None]]] = defaultdict(list)
+
+
+def subscribe(topic: str, callback: Callable[[str], None]):
+    """Call `callback(key)` whenever `key` of `topic` is invalidated by any worker."""
+    _subscribers[topic].append(callback)
+
+
+def _dispatch(topic: str, key: str):
+    for callback in _subscribers.get(topic, ()):
+        try:
+            callback(key)
+        except Exception:
+            logger.exception("Invalidation callback for %s failed", topic)
+
+
+class InvalidationChannel:
+    def __init__(self, path: str = INVALIDATION_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_seen = 0
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS invalidations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                key TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+        # Connections must not be shared with forked workers (gunicorn preload)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._thread = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def publish(self, topic: str, key):
+        key = str(key)
+        _dispatch(topic, key)
+        try:
+            self._conn().execute(
+                "INSERT INTO invalidations (topic, key, created_at) VALUES (?, ?, ?)",
+                (topic, key, time.time()),
+            )
+        except sqlite3.Error:
+            # Other workers fall back to their cache TTLs
+            logger.exception("Could not publish invalidation %s:%s", topic, key)
+
+    def poll(self):
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, topic, key FROM invalidations WHERE id > ? ORDER BY id", (self._last_seen,)
+        ).fetchall()
+        for event_id, topic, key in rows:
+            _dispatch(topic, key)
+            self._last_seen = event_id
+
+    def _run(self):
+        last_prune = 0.0
+        while not self._stop.wait(POLL_INTERVAL_SECONDS):
+            try:
+                self.poll()
+                if time.time() - last_prune > 60:
+                    self._conn().execute(
+                        "DELETE FROM invalidations WHERE created_at < ?", (time.time() - RETENTION_SECONDS,)
+                    )
+                    last_prune = time.time()
+            except sqlite3.Error:
+                logger.exception("Invalidation poll failed")
+
+    def start(self):
+        # Events from before this process started are already reflected in the DB
+        row = self._conn().execute("SELECT MAX(id) FROM invalidations").fetchone()
+        self._last_seen = row[0] or 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="invalidation-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(POLL_INTERVAL_SECONDS * 4)
+            self._thread = None
+
+
+channel = InvalidationChannel()
+
+
+def publish(topic: str, key):
+    channel.publish(topic, key)
+
+
+class LocalCache:
+    """Bounded per-process LRU cache with a TTL, evicted by invalidation events."""
+
+    def __init__(self, topic: str, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        subscribe(topic, self.invalidate)
+
+    def generation(self) -> int:
+        """Take before loading a value; pass to set() so a load that raced an invalidation is dropped."""
+        return self._generation
+
+    def get(self, key):
+        key = str(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[str(key)] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(str(key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -0,0 +1,227 @@
+"""
+Durable in-process background job queue.
+
+Jobs are rows in a local SQLite table (JOB_QUEUE_PATH, default `jobs.db`), so
+anything enqueued survives a restart. A small pool of worker threads started
+from the app lifespan claims due jobs, retries failures with exponential
+backoff and, on shutdown, finishes the jobs already in hand before exiting.
+Jobs whose worker died mid-run are claimed again once their lease expires,
+and finished jobs are deleted after JOB_RETENTION_SECONDS.
+
+Usage:
+
+    @job("send_email")
+    def send_email(to, subject): ...
+
+    enqueue("send_email", {"to": ..., "subject": ...}, idempotency_key="welcome:42")
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 600.0
+POLL_INTERVAL_SECONDS = 1.0
+# A job still 'running' this long after being claimed is assumed orphaned
+# and claimed again
+LEASE_SECONDS = 300.0
+# Finished jobs (and their idempotency keys) are deleted after this long
+RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+_handlers: Dict[str, Callable] = {}
+
+
+def job(name: str):
+    """Register a function as the handler for jobs called `name`."""
+    def decorator(func: Callable) -> Callable:
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+        # Connections and threads must not be shared with forked workers (gunicorn preload)
+        os.register_at_fork(after_in_child=self._after_fork)
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at REAL NOT NULL,
+                claimed_at REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_due ON jobs (status, run_at);
+            """
+        )
+        self._last_prune = float("-inf")
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._threads = []
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(
+        self,
+        name: str,
+        payload: Optional[dict] = None,
+        idempotency_key: Optional[str] = None,
+        delay: float = 0.0,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> Optional[int]:
+        """Add a job. Returns its id, or None if `idempotency_key` was already used."""
+        if name not in _handlers:
+            raise ValueError(f"No handler registered for job '{name}'")
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO jobs (name, payload, idempotency_key, max_attempts, run_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, json.dumps(payload or {}), idempotency_key, max_attempts, now + delay, now),
+        )
+        self._wakeup.set()
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def _claim(self):
+        """Claim the next due job, or one whose worker's lease has expired."""
+        conn = self._conn()
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, name, payload, attempts, max_attempts FROM jobs "
+                "WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND claimed_at < ?) "
+                "ORDER BY run_at LIMIT 1",
+                (now, now - LEASE_SECONDS),
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                    (now, row[0]),
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _fail(self, job_id: int, error: str):
+        self._conn().execute(
+            "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?",
+            (error, time.time(), job_id),
+        )
+
+    def prune(self):
+        """Delete finished jobs older than RETENTION_SECONDS, freeing their idempotency keys."""
+        self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - RETENTION_SECONDS,),
+        )
+
+    def _run(self, job_id: int, name: str, payload: str, attempts: int, max_attempts: int):
+        conn = self._conn()
+        try:
+            _handlers[name](**json.loads(payload))
+        except Exception as e:
+            attempts += 1
+            if attempts >= max_attempts:
+                logger.exception("Job %s (%s) failed permanently", job_id, name)
+                self._fail(job_id, repr(e))
+            else:
+                backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+                backoff *= random.uniform(0.5, 1.0)
+                logger.warning("Job %s (%s) failed, retrying in %.1fs: %r", job_id, name, backoff, e)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', last_error = ?, run_at = ? WHERE id = ?",
+                    (repr(e), time.time() + backoff, job_id),
+                )
+            return
+        conn.execute(
+            "UPDATE jobs SET status = 'done', last_error = NULL, finished_at = ? WHERE id = ?",
+            (time.time(), job_id),
+        )
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+                    self._last_prune = time.monotonic()
+                    self.prune()
+                row = self._claim()
+            except sqlite3.Error:
+                logger.exception("Could not claim job")
+                row = None
+            if row is None:
+                self._wakeup.wait(POLL_INTERVAL_SECONDS)
+                self._wakeup.clear()
+                continue
+            job_id, name, payload, attempts, max_attempts = row
+            # A bookkeeping UPDATE failing (e.g. the file is locked) must not kill
+            # the thread; the job stays 'running' and is reclaimed after its lease
+            try:
+                if name not in _handlers:
+                    logger.error("Job %s has no handler '%s'", job_id, name)
+                    self._fail(job_id, "no handler")
+                elif attempts >= max_attempts:
+                    # Reclaimed after its last attempt's worker died mid-job
+                    logger.error("Job %s (%s) lease expired on its last attempt", job_id, name)
+                    self._fail(job_id, "lease expired")
+                else:
+                    self._run(job_id, name, payload, attempts, max_attempts)
+            except Exception:
+                logger.exception("Could not record the result of job %s (%s)", job_id, name)
+
+    def start(self, workers: int = JOB_WORKERS):
+        self._stop.clear()
+        for index in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 30.0):
+        """Stop claiming new jobs and wait for in-flight ones to finish."""
+        self._stop.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+
+queue = JobQueue()
+
+
+def enqueue(name: str, payload: Optional[dict] = None, **kwargs) -> Optional[int]:
+    return queue.enqueue(name, payload, **kwargs)
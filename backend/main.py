@@ -1,3 +1,4 @@
+import logging
 import os
 from pathlib import Path
 
@@ -9,32 +10,78 @@ if env_path.exists():
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi import UploadFile, File
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from database import engine, Base
-from routers import auth, users, posts, appointments
-import uuid
+from ratelimit import AdmissionControlMiddleware
+from compression import CompressionMiddleware
+from profiling import ServerTimingMiddleware, instrument_fastapi, phase
+from static_files import CachedStaticFiles, content_addressed_name, upload_cache_stats
+from contextlib import asynccontextmanager
+import jobs
+import invalidation
+from sketches import tracker as like_tracker
+import analytics
+import tasks  # registers background job handlers
+from routers import auth, users, posts, appointments, batch, feeds, export
 from PIL import Image, ImageDraw, ImageFont
 import io
 
 # Import models to ensure they are registered with SQLAlchemy
-from models import User, Post, Comment, Appointment
+from models import User, Post, Comment, Appointment, UserStats
+from database import SessionLocal, add_missing_columns
+import crud
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# create_all only builds columns and indexes together with new tables; add any missing ones
+add_missing_columns(Post.__table__)
+for index in Post.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+# One-time backfill of author aggregates for databases created before user_stats existed
+with SessionLocal() as db:
+    if db.query(UserStats).first() is None and db.query(Post.id).first() is not None:
+        crud.rebuild_user_stats(db)
+
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background job workers run for the lifetime of the app and drain on shutdown
+    jobs.queue.start()
+    invalidation.channel.start()
+    like_tracker.start()
+    analytics.counter.start()
+    yield
+    # Each stop flushes or drains; one failing must not skip the rest
+    for stop in (analytics.counter.stop, like_tracker.stop, invalidation.channel.stop, jobs.queue.stop):
+        try:
+            stop()
+        except Exception:
+            logger.exception("Shutdown step %s failed", stop.__qualname__)
+
 # Create FastAPI app
 app = FastAPI(
     title="WanderLuxe Ventures API",
     description="A modern travel blog API with authentication and CRUD operations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Compress JSON responses above COMPRESSION_MIN_SIZE (brotli if installed, else gzip)
+app.add_middleware(CompressionMiddleware)
+
+# Rate limits and concurrency caps; added before CORS so 429/503 responses
+# still carry CORS headers for the browser
+app.add_middleware(AdmissionControlMiddleware)
+
 # CORS middleware for React frontend
 allowed_origins = [
     "http://localhost:3000",
@@ -52,16 +99,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Mount static files for serving uploaded images
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Outermost: Server-Timing phase breakdown and sampled profiling (see profiling.py)
+instrument_fastapi()
+app.add_middleware(ServerTimingMiddleware)
+
+# Mount static files for serving uploaded images (long-lived caching, ETags, ranges)
+app.mount("/uploads", CachedStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(posts.router)
 app.include_router(appointments.router)
+app.include_router(batch.router)
+app.include_router(feeds.router)
+app.include_router(export.router)
 
 @app.get("/")
 async def root():
@@ -71,42 +126,47 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "API is running"}
+    return {
+        "status": "healthy",
+        "message": "API is running",
+        "uploads_cache": dict(upload_cache_stats),
+    }
 
 @app.get("/api/placeholder/{width}/{height}")
 async def get_placeholder_image(width: int, height: int):
     """Generate a placeholder image"""
     try:
-        # Create a simple placeholder image
-        img = Image.new('RGB', (width, height), color='#f3f4f6')
-        draw = ImageDraw.Draw(img)
+        with phase("render"):
+            # Create a simple placeholder image
+            img = Image.new('RGB', (width, height), color='#f3f4f6')
+            draw = ImageDraw.Draw(img)
         
-        # Add some text
-        try:
-            # Try to use a default font
-            font = ImageFont.load_default()
-        except:
-            font = None
+            # Add some text
+            try:
+                # Try to use a default font
+                font = ImageFont.load_default()
+            except:
+                font = None
         
-        text = f"{width}x{height}"
-        if font:
-            # Get text bounding box
-            bbox = draw.textbbox((0, 0), text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
+            text = f"{width}x{height}"
+            if font:
+                # Get text bounding box
+                bbox = draw.textbbox((0, 0), text, font=font)
+                text_width = bbox[2] - bbox[0]
+                text_height = bbox[3] - bbox[1]
             
-            # Center the text
-            x = (width - text_width) // 2
-            y = (height - text_height) // 2
-            draw.text((x, y), text, fill='#9ca3af', font=font)
-        else:
-            # Fallback without font
-            draw.text((width//4, height//2), text, fill='#9ca3af')
+                # Center the text
+                x = (width - text_width) // 2
+                y = (height - text_height) // 2
+                draw.text((x, y), text, fill='#9ca3af', font=font)
+            else:
+                # Fallback without font
+                draw.text((width//4, height//2), text, fill='#9ca3af')
         
-        # Save to bytes
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='PNG')
-        img_byte_arr = img_byte_arr.getvalue()
+            # Save to bytes
+            img_byte_arr = io.BytesIO()
+            img.save(img_byte_arr, format='PNG')
+            img_byte_arr = img_byte_arr.getvalue()
         
         return FileResponse(
             io.BytesIO(img_byte_arr),
@@ -127,16 +187,23 @@ async def upload_image(file: UploadFile = File(...)):
     if not file.content_type.startswith('image/'):
         return {"error": "File must be an image"}
     
-    # Generate unique filename
+    # Name the file after its content so its URL can be cached as immutable
     file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     try:
-        # Save file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        content = await file.read()
+        unique_filename = content_addressed_name(content, file_extension)
+        file_path = os.path.join(UPLOAD_DIR, unique_filename)
+        
+        # Identical uploads map to the same file; only write it once
+        if not os.path.exists(file_path):
+            with open(file_path, "wb") as buffer:
+                buffer.write(content)
+            # SQLite write with a busy timeout; keep it off the event loop
+            await run_in_threadpool(
+                jobs.enqueue, "process_upload", {"path": file_path},
+                idempotency_key=f"process_upload:{unique_filename}"
+            )
         
         # Return the URL to access the image
         image_url = f"/uploads/{unique_filename}"
@@ -150,6 +217,8 @@ async def upload_image(file: UploadFile = File(...)):
         return {"error": f"Failed to upload image: {str(e)}"}
 
 if __name__ == "__main__":
+    # Development server (single process). In production run `gunicorn main:app`,
+    # which picks up gunicorn.conf.py for multi-worker serving.
     import uvicorn
     import os
     
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Boolean, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -32,8 +32,14 @@ class Post(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Derived from content on write (see rendering.py)
+    content_html = Column(Text, nullable=True)
+    excerpt = Column(String(300), nullable=True)
+    word_count = Column(Integer, nullable=True)
+    reading_time = Column(Integer, nullable=True)
+    
     # Foreign key to users table
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     
     # Relationship with user
     owner = relationship("User", back_populates="posts")
@@ -41,6 +47,45 @@ class Post(Base):
     # Relationship with comments
     comments_rel = relationship("Comment", back_populates="post")
 
+class UserStats(Base):
+    """Per-author aggregates, kept up to date by the post/like/comment writes in crud"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_count = Column(Integer, default=0, nullable=False)
+    total_likes = Column(Integer, default=0, nullable=False)
+    total_comments = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class LikeSketch(Base):
+    """Persisted unique-liker sketches for a post (see sketches.py)"""
+    __tablename__ = "like_sketches"
+
+    post_id = Column(Integer, primary_key=True)
+    bloom = Column(LargeBinary, nullable=False)
+    hll = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PostStatsHourly(Base):
+    """Per-post activity counts for one UTC hour (see analytics.py)"""
+    __tablename__ = "post_stats_hourly"
+
+    post_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    views = Column(Integer, default=0, nullable=False)
+    likes = Column(Integer, default=0, nullable=False)
+    comments = Column(Integer, default=0, nullable=False)
+
+class PostStatsDaily(Base):
+    """Per-post activity counts for one UTC day (see analytics.py)"""
+    __tablename__ = "post_stats_daily"
+
+    post_id = Column(Integer, primary_key=True)
+    bucket = Column(Date, primary_key=True)
+    views = Column(Integer, default=0, nullable=False)
+    likes = Column(Integer, default=0, nullable=False)
+    comments = Column(Integer, default=0, nullable=False)
+
 class Comment(Base):
     __tablename__ = "comments"
     
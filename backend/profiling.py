@@ -0,0 +1,274 @@
+"""
+Per-request phase timings and on-demand stack-sampling profiles.
+
+ServerTimingMiddleware can add a `Server-Timing` header breaking a request
+down into phases:
+
+* db        - SQL execution (SQLAlchemy cursor events) and session teardown in get_db
+* auth      - bcrypt hashing / verification and JWT decoding
+* validate  - request parsing, validation and dependency resolution
+* serialize - response_model validation and jsonable_encoder
+* render    - encoding the response body and image rendering
+* total     - the whole request as seen by the middleware
+
+Phases are exclusive: time spent in a nested phase (e.g. db inside a
+dependency) is not counted again in the outer one.
+
+The header leaks timing (e.g. whether /auth/login ran bcrypt for a username),
+so it is only sent on requests carrying `X-Profile: <PROFILE_TOKEN>`, or on
+every request when SERVER_TIMING=1 (for local development).
+
+Profiling is gated by PROFILE_TOKEN too. A request carrying the header is
+always profiled, and PROFILE_SAMPLE_RATE profiles that fraction of requests
+whose path starts with one of PROFILE_PATHS. Profiles are written to
+PROFILE_DIR in collapsed-stack format ("frame;frame;frame count"), which
+flamegraph.pl, speedscope and inferno read directly; only the newest
+PROFILE_MAX_FILES are kept.
+
+A profile samples the whole process while the request runs: the event loop
+thread and every thread-pool worker, so stacks from concurrent requests are
+included. Profile on a quiet worker (or with low concurrency) to isolate one
+request; file names start with "process-" as a reminder.
+"""
+import hmac
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "0") == "1"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/").split(",") if p)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Oldest profiles are deleted beyond this many files
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_INTERVAL_SECONDS = 0.001
+
+# Innermost frames in these files mean the sampled thread is idle
+IDLE_FILES = {"threading.py", "queue.py"}
+
+PHASES = ("db", "auth", "validate", "serialize", "render")
+
+# Phase totals for the current request, plus a stack of open phases so nested
+# time can be excluded from the enclosing phase
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timings", default=None)
+_open_phases: ContextVar[Optional[List[list]]] = ContextVar("server_timing_stack", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Attribute the wrapped block's (exclusive) time to `name` for the current request."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    stack = _open_phases.get()
+    frame = [name, time.perf_counter(), 0.0]  # name, start, time spent in nested phases
+    stack.append(frame)
+    try:
+        yield
+    finally:
+        stack.pop()
+        elapsed = time.perf_counter() - frame[1]
+        timings[name] = timings.get(name, 0.0) + elapsed - frame[2]
+        if stack:
+            stack[-1][2] += elapsed
+
+
+def timed(name: str):
+    """Decorator form of phase() for sync and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with phase(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine):
+    """Count SQL execution time towards the db phase."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _timings.get() is not None:
+            context._server_timing_phase = phase("db")
+            context._server_timing_phase.__enter__()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        timing_phase = getattr(context, "_server_timing_phase", None)
+        if timing_phase is not None:
+            context._server_timing_phase = None
+            timing_phase.__exit__(None, None, None)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        timing_phase = getattr(context, "_server_timing_phase", None) if context else None
+        if timing_phase is not None:
+            context._server_timing_phase = None
+            timing_phase.__exit__(None, None, None)
+
+
+def instrument_fastapi():
+    """Wrap FastAPI's request-validation and response-serialization steps."""
+    import fastapi.routing
+    from starlette.responses import JSONResponse
+    from fastapi.responses import ORJSONResponse
+
+    fastapi.routing.solve_dependencies = timed("validate")(fastapi.routing.solve_dependencies)
+    fastapi.routing.serialize_response = timed("serialize")(fastapi.routing.serialize_response)
+    JSONResponse.render = timed("render")(JSONResponse.render)
+    ORJSONResponse.render = timed("render")(ORJSONResponse.render)
+
+
+class StackSampler:
+    """Samples the stacks of the given threads into collapsed-stack counts."""
+
+    def __init__(self, thread_ids, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.thread_ids = set(thread_ids)
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.thread_ids | _worker_thread_ids():
+                frame = frames.get(thread_id)
+                # Idle pool threads just sit in a queue / lock wait
+                if frame is None or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _save_profile(sampler: StackSampler, path: str):
+    """Stop `sampler`, write its profile and drop the oldest files past PROFILE_MAX_FILES (blocking)."""
+    sampler.stop()
+    sampler.write(path)
+    directory = os.path.dirname(path)
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".folded")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _worker_thread_ids():
+    # Sync endpoints and dependencies run in AnyIO's thread pool
+    return {
+        thread.ident for thread in threading.enumerate()
+        if thread.name.startswith("AnyIO worker thread") and thread.ident is not None
+    }
+
+
+def _has_profile_token(scope) -> bool:
+    if not PROFILE_TOKEN:
+        return False
+    for name, value in scope.get("headers") or []:
+        if name == b"x-profile":
+            return hmac.compare_digest(value.decode("latin-1"), PROFILE_TOKEN)
+    return False
+
+
+def _sampled(scope) -> bool:
+    return (
+        PROFILE_TOKEN is not None
+        and PROFILE_SAMPLE_RATE > 0
+        and scope["path"].startswith(PROFILE_PATHS)
+        and random.random() < PROFILE_SAMPLE_RATE
+    )
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding Server-Timing headers (when allowed) and optional sampled profiles."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        authorized = _has_profile_token(scope)
+        emit_header = SERVER_TIMING_ENABLED or authorized
+        profile = authorized or _sampled(scope)
+        if not emit_header and not profile:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        timings_token = _timings.set(timings)
+        stack_token = _open_phases.set([])
+        start = time.perf_counter()
+
+        sampler = None
+        if profile:
+            sampler = StackSampler([threading.get_ident()])
+            sampler.start()
+
+        async def send_wrapper(message):
+            if emit_header and message["type"] == "http.response.start":
+                parts = [f"{name};dur={timings[name] * 1000:.2f}" for name in PHASES if name in timings]
+                parts.append(f"total;dur={(time.perf_counter() - start) * 1000:.2f}")
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", ", ".join(parts).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(timings_token)
+            _open_phases.reset(stack_token)
+            if sampler is not None:
+                safe_path = scope["path"].strip("/").replace("/", "_") or "root"
+                # Process-wide samples taken while this request ran, not just its own stacks
+                filename = (
+                    f"process-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+                    f"-during-{scope['method']}-{safe_path}.folded"
+                )
+                # Joining the sampler and writing the file both block
+                await run_in_threadpool(_save_profile, sampler, os.path.join(PROFILE_DIR, filename))
@@ -0,0 +1,277 @@
+"""
+Admission control for expensive endpoints.
+
+Two layers, both applied before the request reaches FastAPI routing:
+
+* Per-client token buckets, configured per route. Clients are keyed by the
+  JWT subject when a Bearer token is present, otherwise by remote IP (see
+  client_ip for how X-Forwarded-For is trusted).
+* Global concurrency caps that shed load with a fast 503 instead of queueing
+  behind slow bcrypt / PIL / DB work, so reads keep a bounded tail latency.
+
+Buckets live in memory by default. Set RATE_LIMIT_STORE to a SQLite file path
+to share them between worker processes.
+"""
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from auth import get_token_subject
+
+
+class RatePolicy:
+    """Token bucket: `burst` requests at once, refilled at `rate` per second."""
+
+    def __init__(self, method: str, path: str, rate: float, burst: int, key: str = "ip"):
+        self.method = method.upper()
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.key = key  # "ip" or "user" (falls back to ip when anonymous)
+        pattern = re.sub(r"\{[^/]+\}", r"[^/]+", path.rstrip("/"))
+        self._regex = re.compile(f"^{pattern}/?$")
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self._regex.match(path) is not None
+
+    @property
+    def ttl(self) -> float:
+        # An idle bucket is full again after burst / rate seconds; drop it then
+        return self.burst / self.rate
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+DEFAULT_POLICIES = [
+    RatePolicy("POST", "/auth/login", rate=_env_float("RATE_LIMIT_LOGIN_PER_SEC", 0.2), burst=5),
+    RatePolicy("POST", "/users/register", rate=0.05, burst=3),
+    RatePolicy("POST", "/posts/{post_id}/like", rate=1.0, burst=10),
+    RatePolicy("POST", "/appointments/", rate=0.1, burst=5, key="user"),
+    RatePolicy("POST", "/upload-image", rate=0.2, burst=5, key="user"),
+]
+
+# Proxies in front of the app that append to X-Forwarded-For. 0 (the default)
+# ignores the header, which a client can set freely; Render sets this to 1
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+
+# Concurrency classes: requests matching a prefix share one in-flight cap
+DEFAULT_CONCURRENCY = [
+    ("POST", "/auth/login", int(os.getenv("MAX_CONCURRENT_LOGINS", 4))),
+    ("POST", "/upload-image", int(os.getenv("MAX_CONCURRENT_UPLOADS", 4))),
+    ("*", "", int(os.getenv("MAX_CONCURRENT_REQUESTS", 256))),
+]
+
+
+class MemoryBucketStore:
+    """In-process bucket store; O(1) per take, idle buckets expire lazily."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def take(self, key: str, rate: float, burst: int, ttl: float) -> float:
+        """Consume one token. Returns 0 if allowed, else seconds until retry."""
+        now = time.monotonic()
+        with self._lock:
+            # Expire at most a couple of stale entries per call (oldest first)
+            for _ in range(2):
+                if not self._buckets:
+                    break
+                oldest_key, (_, _, expires) = next(iter(self._buckets.items()))
+                if expires > now and len(self._buckets) < self.max_keys:
+                    break
+                del self._buckets[oldest_key]
+
+            tokens, updated, _ = self._buckets.pop(key, (burst, now, 0.0))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, now + ttl)
+                return 0.0
+            self._buckets[key] = (tokens, now, now + ttl)
+            return (1 - tokens) / rate
+
+
+class SQLiteBucketStore:
+    """Bucket store shared by all workers on one host through a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.register_at_fork(after_in_child=self._after_fork)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_buckets_expires ON rate_buckets (expires)")
+        self._last_sweep = 0.0
+
+    def _after_fork(self):
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: int, ttl: float) -> float:
+        # Wall clock, since monotonic time is not comparable across processes
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if now - self._last_sweep > 60:
+                conn.execute("DELETE FROM rate_buckets WHERE expires < ?", (now,))
+                self._last_sweep = now
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, expires) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + ttl),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Fail open: a locked store must not take the API down with it
+            return 0.0
+        return 0.0 if allowed else (1 - tokens) / rate
+
+
+def create_bucket_store():
+    store_path = os.getenv("RATE_LIMIT_STORE")
+    if store_path:
+        return SQLiteBucketStore(store_path)
+    return MemoryBucketStore()
+
+
+def client_ip(scope) -> str:
+    """Client address as seen by the outermost of TRUSTED_PROXY_HOPS proxies.
+
+    Each proxy appends the address it received from, so only the last
+    TRUSTED_PROXY_HOPS entries of X-Forwarded-For are trustworthy; anything
+    before them was sent by the client.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    headers = dict(scope.get("headers") or [])
+    forwarded = headers.get(b"x-forwarded-for")
+    if not forwarded:
+        return peer
+    entries = [entry.strip() for entry in forwarded.decode("latin-1").split(",") if entry.strip()]
+    if len(entries) < TRUSTED_PROXY_HOPS:
+        return peer
+    return entries[-TRUSTED_PROXY_HOPS]
+
+
+def _token_subject(scope) -> Optional[str]:
+    headers = dict(scope.get("headers") or [])
+    return get_token_subject(headers.get(b"authorization", b"").decode("latin-1"))
+
+
+async def _send_error(send, status_code: int, detail: str, retry_after: float):
+    body = ('{"detail":"%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying rate limits and concurrency caps."""
+
+    def __init__(
+        self,
+        app,
+        policies: Optional[List[RatePolicy]] = None,
+        concurrency: Optional[List[Tuple[str, str, int]]] = None,
+        store=None,
+    ):
+        self.app = app
+        self.policies = DEFAULT_POLICIES if policies is None else policies
+        self.store = store or create_bucket_store()
+        # Caps of 0 are disabled; in-flight counts are indexed like _limits
+        self._limits: List[Tuple[str, str, int]] = [
+            (method.upper(), prefix, limit)
+            for method, prefix, limit in (DEFAULT_CONCURRENCY if concurrency is None else concurrency)
+            if limit > 0
+        ]
+        self._in_flight: List[int] = [0] * len(self._limits)
+
+    def _policy_for(self, method: str, path: str) -> Optional[RatePolicy]:
+        for policy in self.policies:
+            if policy.matches(method, path):
+                return policy
+        return None
+
+    def _acquire(self, method: str, path: str) -> Optional[List[int]]:
+        """Reserve a slot in every matching class, or None if any is full."""
+        matched = [
+            index for index, (m, prefix, _) in enumerate(self._limits)
+            if (m == "*" or m == method) and path.startswith(prefix)
+        ]
+        if any(self._in_flight[index] >= self._limits[index][2] for index in matched):
+            return None
+        for index in matched:
+            self._in_flight[index] += 1
+        return matched
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        policy = self._policy_for(method, path)
+        if policy is not None:
+            subject = _token_subject(scope) if policy.key == "user" else None
+            client = f"user:{subject}" if subject else f"ip:{client_ip(scope)}"
+            key = f"{policy.method} {policy.path} {client}"
+            # SQLite store blocks on file locks; keep that off the event loop
+            if isinstance(self.store, SQLiteBucketStore):
+                retry_after = await asyncio.get_running_loop().run_in_executor(
+                    None, self.store.take, key, policy.rate, policy.burst, policy.ttl
+                )
+            else:
+                retry_after = self.store.take(key, policy.rate, policy.burst, policy.ttl)
+            if retry_after > 0:
+                await _send_error(send, 429, "Too many requests", retry_after)
+                return
+
+        # Single event loop per worker, so plain counters are race-free here
+        slots = self._acquire(method, path)
+        if slots is None:
+            await _send_error(send, 503, "Server busy, please retry", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            for index in slots:
+                self._in_flight[index] -= 1
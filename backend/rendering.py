@@ -0,0 +1,155 @@
+"""
+Derived post fields: sanitized HTML, plain-text excerpt, word count and
+reading time. Computed once when a post is written (see crud.create_post /
+crud.update_post) and stored on the row.
+
+Backfill existing rows with:
+
+    python rendering.py
+"""
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+
+ALLOWED_TAGS = {
+    "a", "b", "blockquote", "br", "code", "em", "h1", "h2", "h3", "h4", "h5", "h6",
+    "hr", "i", "img", "li", "ol", "p", "pre", "s", "span", "strong", "u", "ul",
+}
+VOID_TAGS = {"br", "hr", "img"}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+SAFE_URL = re.compile(r"^(https?:|mailto:|/|#)", re.IGNORECASE)
+# Content of these is dropped entirely, not just the tags
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "template"}
+# Block-level tags that separate words in the plain-text version
+BLOCK_TAGS = {"blockquote", "br", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "p", "pre", "div"}
+
+
+class _Renderer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html: List[str] = []
+        self.text: List[str] = []
+        self._open: List[str] = []
+        self._dropping = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+            return
+        if self._dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if name not in ALLOWED_ATTRIBUTES.get(tag, ()) or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not SAFE_URL.match(value.strip()):
+                continue
+            kept.append(f' {name}="{escape(value, quote=True)}"')
+        if tag == "a":
+            kept.append(' rel="nofollow noopener"')
+        self.html.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping = max(0, self._dropping - 1)
+            return
+        if self._dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag in self._open:
+            # Close anything left open inside this tag so the output stays balanced
+            while self._open:
+                open_tag = self._open.pop()
+                self.html.append(f"</{open_tag}>")
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data: str):
+        if self._dropping:
+            return
+        self.text.append(data)
+        # Authors write plain text with line breaks; keep them visible
+        self.html.append(escape(data, quote=False).replace("\n", "<br />"))
+
+    def close(self):
+        super().close()
+        while self._open:
+            self.html.append(f"</{self._open.pop()}>")
+
+
+def _excerpt(text: str) -> str:
+    if len(text) <= EXCERPT_LENGTH:
+        return text
+    cut = text[:EXCERPT_LENGTH].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;:") + "..."
+
+
+def render_post_content(content: str) -> Dict[str, object]:
+    """Derived fields for a post body; keys match the Post columns."""
+    renderer = _Renderer()
+    renderer.feed(content or "")
+    renderer.close()
+    text = " ".join("".join(renderer.text).split())
+    word_count = len(text.split())
+    return {
+        "content_html": "".join(renderer.html),
+        "excerpt": _excerpt(text),
+        "word_count": word_count,
+        "reading_time": max(1, math.ceil(word_count / WORDS_PER_MINUTE)),
+    }
+
+
+def backfill(batch_size: int = 200) -> int:
+    """Compute derived fields for posts that don't have them yet. Returns the number updated."""
+    from database import SessionLocal, add_missing_columns
+    from invalidation import publish
+    from models import Post
+
+    add_missing_columns(Post.__table__)
+    updated = 0
+    with SessionLocal() as db:
+        while True:
+            rows = (
+                db.query(Post.id, Post.content)
+                .filter(Post.word_count.is_(None))
+                .order_by(Post.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for post_id, content in rows:
+                values = {getattr(Post, field): value for field, value in render_post_content(content).items()}
+                # Keep updated_at as is: a backfill is not an edit
+                values[Post.updated_at] = Post.updated_at
+                db.query(Post).filter(Post.id == post_id).update(values, synchronize_session=False)
+            db.commit()
+            for post_id, _ in rows:
+                publish("post", post_id)
+            updated += len(rows)
+    return updated
+
+
+if __name__ == "__main__":
+    print(f"Backfilled {backfill()} posts")
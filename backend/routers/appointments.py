@@ -8,6 +8,7 @@ from models import User
 from schemas import AppointmentCreate, AppointmentResponse, AppointmentListResponse
 from auth import get_current_active_user, get_optional_current_user
 import crud
+import jobs
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -24,6 +25,16 @@ def create_booking(
     """
     user_id = optional_user.id if optional_user else None
     appt = crud.create_appointment(db, payload, user_id=user_id)
+    jobs.enqueue(
+        "send_appointment_confirmation",
+        {
+            "email": appt.email,
+            "full_name": appt.full_name,
+            "appointment_date": appt.appointment_date.isoformat(),
+            "appointment_time": appt.appointment_time,
+        },
+        idempotency_key=f"appointment_confirmation:{appt.id}",
+    )
     return appt
 
 
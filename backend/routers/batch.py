@@ -0,0 +1,83 @@
+from urllib.parse import unquote
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request
+
+from schemas import BatchRequest, BatchResponse
+
+router = APIRouter(tags=["batch"])
+
+MAX_BATCH_REQUESTS = 20
+# Sub-responses are buffered whole, so only the JSON API is batchable: not
+# streamed exports, binary uploads or the (large) XML feeds
+UNBATCHABLE_PATHS = ("/batch", "/export", "/uploads", "/feed.xml", "/atom.xml", "/sitemap.xml")
+
+
+def _batchable(path: str) -> bool:
+    path = unquote(path.partition("?")[0]).rstrip("/")
+    return path.startswith("/") and not any(
+        path == prefix or path.startswith(prefix + "/") for prefix in UNBATCHABLE_PATHS
+    )
+
+
+async def _dispatch(request: Request, path: str) -> dict:
+    """Run one GET through the full app in-process and capture its response."""
+    raw_path, _, query = path.partition("?")
+    # Forward credentials only; everything else uses server defaults
+    headers = [
+        (name, value) for name, value in request.scope["headers"]
+        if name in (b"authorization", b"cookie", b"x-forwarded-for")
+    ]
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.scope.get("scheme", "http"),
+        "path": unquote(raw_path),
+        "raw_path": raw_path.encode(),
+        "root_path": request.scope.get("root_path", ""),
+        "query_string": query.encode(),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+    }
+    status_code = 500
+    content_type = b""
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status_code, content_type
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            content_type = dict(message.get("headers") or []).get(b"content-type", b"")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await request.app(scope, receive, send)
+    body = b"".join(chunks)
+    if content_type.startswith(b"application/json") and body:
+        return {"status": status_code, "body": orjson.loads(body)}
+    return {"status": status_code, "body": body.decode("utf-8", "replace") or None}
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch(payload: BatchRequest, request: Request):
+    """
+    Run several read requests in one round trip, e.g. a post, its comments and
+    like state. Only GET sub-requests to JSON API routes are allowed; each
+    returns its own status.
+    """
+    if len(payload.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_REQUESTS} requests per batch")
+    for item in payload.requests:
+        if item.method.upper() != "GET":
+            raise HTTPException(status_code=422, detail="Only GET requests can be batched")
+        if not _batchable(item.path):
+            raise HTTPException(status_code=422, detail=f"Invalid batch path: {item.path}")
+
+    responses = [await _dispatch(request, item.path) for item in payload.requests]
+    return {"responses": responses}
@@ -0,0 +1,43 @@
+from datetime import date, datetime, time
+from typing import Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from models import User
+from auth import get_current_admin_user
+from export import EXPORTS, FORMATS, stream_export
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+@router.get("/{table}")
+def export_table(
+    table: str,
+    format: str = "ndjson",
+    gzip: bool = False,
+    updated_since: Optional[Union[datetime, date]] = None,
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    Stream every row of `posts`, `comments` or `appointments` as NDJSON or CSV
+    (admin only). `updated_since` (ISO date or date-time) limits the export to rows
+    created or updated after that time; `gzip=true` downloads a gzip file
+    (`application/gzip`, `.gz` filename).
+    """
+    # A plain date (as the CLI accepts) means midnight at the start of that day
+    if isinstance(updated_since, date) and not isinstance(updated_since, datetime):
+        updated_since = datetime.combine(updated_since, time())
+    if table not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {table}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of: {', '.join(sorted(FORMATS))}")
+
+    # gzip=true is a .gz file download, not a transfer encoding, so clients
+    # save exactly what the filename says
+    filename = f"{table}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_export(table, format, gzip=gzip, updated_since=updated_since),
+        media_type="application/gzip" if gzip else FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,196 @@
+"""
+RSS, Atom and sitemap documents.
+
+Each document is rendered by streaming over posts with a server-side cursor
+and cached in memory with a content ETag and a Last-Modified taken from the
+newest post timestamp. Post writes (in any worker) mark the cache stale through
+the invalidation channel; a stale document is only re-rendered if the version
+(newest timestamp, post count) has actually changed, and clients revalidating
+with If-None-Match / If-Modified-Since get a 304 without a posts query.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Iterator, Optional
+from xml.sax.saxutils import escape
+
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import get_db
+from invalidation import subscribe
+from models import Post
+
+router = APIRouter(tags=["feeds"])
+
+SITE_URL = os.getenv("SITE_URL", "https://www.wanderluxe.live").rstrip("/")
+SITE_TITLE = "WanderLuxe Ventures"
+SITE_DESCRIPTION = "Travel stories and guides from WanderLuxe Ventures"
+FEED_LIMIT = 50
+SITEMAP_LIMIT = 50000  # sitemaps.org maximum per file
+STATIC_PAGES = ("/", "/about", "/blogs", "/contact", "/book", "/join")
+# Re-check the post version at least this often even without invalidation events
+RECHECK_SECONDS = 300
+STREAM_BATCH_SIZE = 500
+
+_cache: Dict[str, dict] = {}
+
+
+def _mark_stale(_key: str):
+    for entry in _cache.values():
+        entry["stale"] = True
+
+
+subscribe("post", _mark_stale)
+
+
+def _as_utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime(1970, 1, 1, tzinfo=timezone.utc)
+    # SQLite hands back naive UTC timestamps
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _post_url(post_id: int) -> str:
+    return f"{SITE_URL}/blogs/singlepost/{post_id}"
+
+
+def _posts_version(db: Session):
+    latest, count = db.query(
+        func.max(func.coalesce(Post.updated_at, Post.created_at)),
+        func.count(Post.id)
+    ).one()
+    return _as_utc(latest), count
+
+
+def _stream(db: Session, *columns, limit: int):
+    return (
+        db.query(*columns)
+        .order_by(Post.id.desc())
+        .limit(limit)
+        .execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+    )
+
+
+def _summary(description: Optional[str], content: str) -> str:
+    if description:
+        return description
+    return content[:300] + ("..." if len(content) > 300 else "")
+
+
+def render_rss(db: Session, last_modified: datetime) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>'
+    yield f"<title>{escape(SITE_TITLE)}</title><link>{SITE_URL}/blogs</link>"
+    yield f"<description>{escape(SITE_DESCRIPTION)}</description>"
+    yield f"<lastBuildDate>{format_datetime(last_modified)}</lastBuildDate>"
+    rows = _stream(db, Post.id, Post.title, Post.description, Post.content, Post.author, Post.created_at, limit=FEED_LIMIT)
+    for post_id, title, description, content, author, created_at in rows:
+        url = _post_url(post_id)
+        yield (
+            f"<item><title>{escape(title)}</title><link>{url}</link>"
+            f'<guid isPermaLink="true">{url}</guid>'
+            f"<description>{escape(_summary(description, content))}</description>"
+            f"<author>{escape(author)}</author>"
+            f"<pubDate>{format_datetime(_as_utc(created_at))}</pubDate></item>"
+        )
+    yield "</channel></rss>"
+
+
+def render_atom(db: Session, last_modified: datetime) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+    yield f"<title>{escape(SITE_TITLE)}</title><subtitle>{escape(SITE_DESCRIPTION)}</subtitle>"
+    yield f'<link href="{SITE_URL}/blogs"/><link rel="self" href="{SITE_URL}/atom.xml"/>'
+    yield f"<id>{SITE_URL}/</id><updated>{last_modified.isoformat()}</updated>"
+    rows = _stream(
+        db, Post.id, Post.title, Post.description, Post.content, Post.author, Post.created_at, Post.updated_at,
+        limit=FEED_LIMIT
+    )
+    for post_id, title, description, content, author, created_at, updated_at in rows:
+        url = _post_url(post_id)
+        yield (
+            f"<entry><title>{escape(title)}</title><link href=\"{url}\"/><id>{url}</id>"
+            f"<published>{_as_utc(created_at).isoformat()}</published>"
+            f"<updated>{_as_utc(updated_at or created_at).isoformat()}</updated>"
+            f"<author><name>{escape(author)}</name></author>"
+            f"<summary>{escape(_summary(description, content))}</summary></entry>"
+        )
+    yield "</feed>"
+
+
+def render_sitemap(db: Session, last_modified: datetime) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+    for path in STATIC_PAGES:
+        yield f"<url><loc>{SITE_URL}{path}</loc></url>"
+    rows = _stream(db, Post.id, Post.created_at, Post.updated_at, limit=SITEMAP_LIMIT - len(STATIC_PAGES))
+    for post_id, created_at, updated_at in rows:
+        lastmod = _as_utc(updated_at or created_at).date().isoformat()
+        yield f"<url><loc>{_post_url(post_id)}</loc><lastmod>{lastmod}</lastmod></url>"
+    yield "</urlset>"
+
+
+def _not_modified(request: Request, entry: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Weak comparison: the compression middleware marks encoded ETags as W/
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        tags = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+        return entry["etag"] in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return entry["last_modified"].replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _serve(request: Request, db: Session, name: str, render: Callable, media_type: str) -> Response:
+    entry = _cache.get(name)
+    if entry is None or entry["stale"] or time.monotonic() - entry["checked"] > RECHECK_SECONDS:
+        version = _posts_version(db)
+        if entry is None or entry["version"] != version:
+            last_modified = version[0]
+            body = "".join(render(db, last_modified)).encode("utf-8")
+            entry = {
+                "body": body,
+                "version": version,
+                "last_modified": last_modified,
+                "etag": '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+            }
+            _cache[name] = entry
+        entry["stale"] = False
+        entry["checked"] = time.monotonic()
+
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": format_datetime(entry["last_modified"], usegmt=True),
+        "Cache-Control": "public, max-age=300",
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type=media_type, headers=headers)
+
+
+# Plain def: rendering streams up to SITEMAP_LIMIT rows synchronously, so these
+# run in the thread pool rather than blocking the event loop
+@router.get("/feed.xml")
+def rss_feed(request: Request, db: Session = Depends(get_db)):
+    """RSS 2.0 feed of the latest posts"""
+    return _serve(request, db, "rss", render_rss, "application/rss+xml")
+
+
+@router.get("/atom.xml")
+def atom_feed(request: Request, db: Session = Depends(get_db)):
+    """Atom feed of the latest posts"""
+    return _serve(request, db, "atom", render_atom, "application/atom+xml")
+
+
+@router.get("/sitemap.xml")
+def sitemap(request: Request, db: Session = Depends(get_db)):
+    """Sitemap of site pages and every post"""
+    return _serve(request, db, "sitemap", render_sitemap, "application/xml")
@@ -1,36 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
 from typing import Optional
 from database import get_db
 from models import User, Post
-from schemas import PostCreate, PostUpdate, PostResponse, PostListResponse, CommentCreate, CommentResponse, CommentListResponse
-from crud import get_posts, get_post, create_post, update_post, delete_post, like_post, get_comments, create_comment, delete_comment
-from auth import get_current_active_user
+from schemas import PostCreate, PostUpdate, PostResponse, PostListResponse, PostBatchResponse, PostLikesResponse, PostStatsResponse, CommentCreate, CommentResponse, CommentListResponse
+from crud import get_posts, get_post, get_posts_by_ids, create_post, update_post, delete_post, like_post, get_comments, create_comment, delete_comment
+from auth import get_current_active_user, get_token_subject
+from ratelimit import client_ip
+from sketches import tracker, liker_key
+from invalidation import LocalCache
+from analytics import counter as activity, post_stats, utc_naive, HOURLY_RETENTION_DAYS
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+MAX_BATCH_IDS = 100
+DEFAULT_STATS_DAYS = 7
+
+# Per-worker cache of single posts; writes in any worker evict entries via the
+# invalidation channel
+post_cache = LocalCache("post", max_entries=2048, ttl=300)
+
 @router.get("/", response_model=PostListResponse)
 async def read_posts(
     skip: int = 0, 
     limit: int = 10, 
     search: str = "", 
+    summary: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Get all posts with pagination and search"""
-    result = get_posts(db, skip=skip, limit=limit, search=search)
-    return PostListResponse(
-        posts=result["posts"],
-        total=result["total"],
-        has_more=result["has_more"]
-    )
+    """Get all posts with pagination and search. `summary=true` returns excerpts instead of full bodies."""
+    result = get_posts(db, skip=skip, limit=limit, search=search, summary=summary)
+    # Rows come straight from our own table, so skip re-validating them through
+    # PostListResponse; response_model above still documents the shape
+    return ORJSONResponse(result)
+
+@router.get("/batch", response_model=PostBatchResponse)
+async def read_posts_batch(ids: str, db: Session = Depends(get_db)):
+    """Get several posts by comma-separated IDs, e.g. `?ids=3,1,2` (order is preserved)"""
+    try:
+        post_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    if len(post_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return ORJSONResponse(get_posts_by_ids(db, post_ids))
 
 @router.get("/{post_id}", response_model=PostResponse)
 async def read_post(post_id: int, db: Session = Depends(get_db)):
     """Get a single post by ID"""
-    post = get_post(db, post_id=post_id)
+    post = post_cache.get(post_id)
     if post is None:
+        generation = post_cache.generation()
+        post = get_post(db, post_id=post_id)
+        if post is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        post_cache.set(post_id, post, generation)
+    activity.record(post_id, "views")
+    return ORJSONResponse(post)
+
+@router.get("/{post_id}/stats", response_model=PostStatsResponse)
+async def read_post_stats(
+    post_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    db: Session = Depends(get_db)
+):
+    """Views, likes and comments for a post over [start, end) (default: the last 7 days), by `hour` or `day`"""
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=422, detail="granularity must be 'hour' or 'day'")
+    end = utc_naive(end) if end else datetime.utcnow()
+    start = utc_naive(start) if start else end - timedelta(days=DEFAULT_STATS_DAYS)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if granularity == "hour" and start < datetime.utcnow() - timedelta(days=HOURLY_RETENTION_DAYS):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Hourly stats are kept for {HOURLY_RETENTION_DAYS} days; use granularity=day"
+        )
+    if db.query(Post.id).filter(Post.id == post_id).first() is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post
+    return post_stats(db, post_id, start, end, granularity)
 
 @router.post("/", response_model=PostResponse)
 async def create_new_post(
@@ -70,16 +123,43 @@ async def delete_existing_post(
             status_code=404,
             detail="Post not found or you don't have permission to delete this post"
         )
+    await run_in_threadpool(tracker.forget, post_id)
     return {"message": "Post deleted successfully"}
 
 @router.post("/{post_id}/like", response_model=PostResponse)
-async def like_a_post(post_id: int, db: Session = Depends(get_db)):
-    """Like a post (no authentication required)"""
+async def like_a_post(post_id: int, request: Request, db: Session = Depends(get_db)):
+    """Like a post (no authentication required; one like per user or client)"""
+    liker = liker_key(
+        get_token_subject(request.headers.get("authorization")),
+        client_ip(request.scope),
+        request.headers.get("user-agent", ""),
+    )
+    # Unknown ids must not create sketches (they'd evict real ones)
+    if db.query(Post.id).filter(Post.id == post_id).first() is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    # Repeats are answered from the in-memory sketch without a DB write; the
+    # sketch may need loading from the DB, so keep that off the event loop
+    if not await run_in_threadpool(tracker.add_if_absent, post_id, liker):
+        raise HTTPException(status_code=409, detail="You already liked this post")
     liked_post = like_post(db=db, post_id=post_id)
     if liked_post is None:
+        # Deleted in the meantime; its sketch is dropped with it
         raise HTTPException(status_code=404, detail="Post not found")
+    activity.record(post_id, "likes")
     return liked_post
 
+@router.get("/{post_id}/likes", response_model=PostLikesResponse)
+async def get_post_likes(post_id: int, db: Session = Depends(get_db)):
+    """Like count and the approximate number of distinct likers"""
+    post = get_post(db, post_id=post_id)
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return {
+        "post_id": post_id,
+        "likes": post["likes"],
+        "unique_likers": await run_in_threadpool(tracker.unique_likers, post_id)
+    }
+
 # Comment endpoints
 @router.get("/{post_id}/comments", response_model=CommentListResponse)
 async def get_post_comments(
@@ -113,12 +193,14 @@ async def create_post_comment(
     if post is None:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    return create_comment(
+    new_comment = create_comment(
         db=db, 
         comment=comment, 
         post_id=post_id, 
         user_id=current_user.id
     )
+    activity.record(post_id, "comments")
+    return new_comment
 
 @router.delete("/{post_id}/comments/{comment_id}")
 async def delete_post_comment(
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from typing import Optional
 from database import get_db
 from models import User
-from schemas import UserCreate, UserResponse
+from schemas import UserCreate, UserResponse, UserPostsResponse, UserStatsResponse
 from auth import get_password_hash, get_user_by_username, get_user_by_email
+from crud import get_user_posts, get_user_stats
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -37,3 +40,29 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     db.refresh(db_user)
     
     return db_user
+
+def _ensure_user_exists(db: Session, user_id: int):
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+@router.get("/{user_id}/posts", response_model=UserPostsResponse)
+async def read_user_posts(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    db: Session = Depends(get_db)
+):
+    """Get an author's posts, newest first. Pass `next_cursor` back as `cursor` for the next page."""
+    _ensure_user_exists(db, user_id)
+    try:
+        before_id = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    limit = max(1, min(limit, 100))
+    return ORJSONResponse(get_user_posts(db, user_id, before_id=before_id, limit=limit))
+
+@router.get("/{user_id}/stats", response_model=UserStatsResponse)
+async def read_user_stats(user_id: int, db: Session = Depends(get_db)):
+    """Get an author's post count, total likes and total comments"""
+    _ensure_user_exists(db, user_id)
+    return get_user_stats(db, user_id)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Union
 from datetime import datetime, date
 
 # User schemas
@@ -47,15 +47,85 @@ class PostResponse(PostBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     owner_id: int
+    content_html: Optional[str] = None
+    excerpt: Optional[str] = None
+    word_count: Optional[int] = None
+    reading_time: Optional[int] = None
     
     class Config:
         orm_mode = True
 
+class PostSummary(BaseModel):
+    """PostResponse without the body fields, for cards and lists"""
+    id: int
+    title: str
+    description: Optional[str] = None
+    image: Optional[str] = None
+    author: str
+    likes: int
+    comments: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    owner_id: int
+    excerpt: Optional[str] = None
+    word_count: Optional[int] = None
+    reading_time: Optional[int] = None
+
 class PostListResponse(BaseModel):
-    posts: List[PostResponse]
+    posts: List[Union[PostResponse, PostSummary]]
     total: int
     has_more: bool
 
+class UserPostsResponse(BaseModel):
+    posts: List[PostResponse]
+    next_cursor: Optional[str] = None
+
+class UserStatsResponse(BaseModel):
+    user_id: int
+    post_count: int
+    total_likes: int
+    total_comments: int
+
+class PostLikesResponse(BaseModel):
+    post_id: int
+    likes: int
+    unique_likers: int
+
+class PostStatsBucket(BaseModel):
+    start: datetime
+    views: int
+    likes: int
+    comments: int
+
+class PostStatsResponse(BaseModel):
+    post_id: int
+    start: datetime
+    end: datetime
+    granularity: str
+    views: int
+    likes: int
+    comments: int
+    buckets: List[PostStatsBucket]
+
+class PostBatchResponse(BaseModel):
+    posts: List[PostResponse]
+    missing: List[int]
+
+# Batch (multi-request) envelope
+class BatchRequestItem(BaseModel):
+    method: str = "GET"
+    path: str
+
+class BatchRequest(BaseModel):
+    requests: List[BatchRequestItem]
+
+class BatchResponseItem(BaseModel):
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResponseItem]
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
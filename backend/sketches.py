@@ -0,0 +1,296 @@
+"""
+Per-post unique-liker tracking with fixed-size probabilistic sketches.
+
+Each tracked post has a Bloom filter (has this liker liked before?) and a
+HyperLogLog (roughly how many distinct likers?), about 9 KB per post no matter
+how many likes it gets. Likers are keyed by user id when a valid Bearer token
+is sent, otherwise by a hash of client IP and User-Agent.
+
+Sketches are kept in an LRU of at most MAX_TRACKED_POSTS posts and flushed to
+the like_sketches table every FLUSH_INTERVAL_SECONDS (and on eviction and
+shutdown). Both structures merge losslessly (bitwise OR / register max), so
+workers merge their copy with the stored one on every flush and converge.
+
+Between flushes a worker only knows the likes it handled itself, so a repeat
+routed to a different worker can still get through once.
+
+A Bloom filter can report false positives, so up to about 1% of first-time
+likes are rejected as repeats while a post has fewer than BLOOM_CAPACITY
+likers. Past that the false-positive rate climbs quickly (~40% at 20k), so
+once the HyperLogLog estimate exceeds BLOOM_CAPACITY the post's likes are
+accepted without a repeat check: deduplication is best effort for the first
+~6,800 likers of a post only.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from database import SessionLocal
+from models import LikeSketch
+
+logger = logging.getLogger(__name__)
+
+BLOOM_BITS = 1 << 16            # 8 KB per post
+BLOOM_HASHES = 7                # ~1% false positives at BLOOM_CAPACITY likers
+BLOOM_CAPACITY = 6800
+HLL_PRECISION = 10              # 1024 one-byte registers, ~3% standard error
+# ~9 KB per tracked post, per worker: 1000 posts is ~9 MB in each process
+MAX_TRACKED_POSTS = int(os.getenv("LIKE_SKETCH_MAX_POSTS", 1000))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("LIKE_SKETCH_FLUSH_SECONDS", 30))
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+class BloomFilter:
+    def __init__(self, bits: Optional[bytes] = None):
+        self.bits = bytearray(bits) if bits else bytearray(BLOOM_BITS // 8)
+
+    def _positions(self, digest: bytes):
+        # Kirsch-Mitzenmacher: k positions from two 64-bit halves of one hash
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest: bytes):
+        for p in self._positions(digest):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def merge(self, other: "BloomFilter"):
+        merged = int.from_bytes(self.bits, "little") | int.from_bytes(other.bits, "little")
+        self.bits = bytearray(merged.to_bytes(len(self.bits), "little"))
+
+
+class HyperLogLog:
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers else bytearray(1 << HLL_PRECISION)
+
+    def add(self, digest: bytes):
+        value = int.from_bytes(digest[:8], "big")
+        index = value >> (64 - HLL_PRECISION)
+        rest = value & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class _PostSketch:
+    __slots__ = ("bloom", "hll", "dirty", "saturated")
+
+    def __init__(self, bloom: BloomFilter, hll: HyperLogLog):
+        self.bloom = bloom
+        self.hll = hll
+        self.dirty = False
+        self.saturated = False
+        self.update_saturation()
+
+    def update_saturation(self):
+        # Too full for the Bloom filter to be trusted; only ever goes False -> True
+        if not self.saturated:
+            self.saturated = self.hll.count() > BLOOM_CAPACITY
+
+
+class LikeTracker:
+    """Per-post sketches. Methods may hit the database; call them from a thread pool."""
+
+    def __init__(self, max_posts: int = MAX_TRACKED_POSTS):
+        self.max_posts = max_posts
+        self._sketches: "OrderedDict[int, _PostSketch]" = OrderedDict()
+        # Evicted sketches still being written, so a reload doesn't miss them
+        self._evicting: Dict[int, Tuple[bytes, bytes]] = {}
+        # _lock guards the in-memory state and is never held across database I/O;
+        # _io_lock serializes this tracker's loads and writes (thread pool only)
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._evicting = {}
+        self._thread = None
+
+    def _load(self, post_id: int) -> _PostSketch:
+        with SessionLocal() as db:
+            row = db.query(LikeSketch).filter(LikeSketch.post_id == post_id).first()
+            if row:
+                return _PostSketch(BloomFilter(row.bloom), HyperLogLog(row.hll))
+        return _PostSketch(BloomFilter(), HyperLogLog())
+
+    def _get(self, post_id: int) -> _PostSketch:
+        with self._lock:
+            sketch = self._sketches.get(post_id)
+            if sketch is not None:
+                self._sketches.move_to_end(post_id)
+                return sketch
+        evicted = {}
+        with self._io_lock:
+            loaded = self._load(post_id)
+            with self._lock:
+                pending = self._evicting.get(post_id)
+                if pending is not None:
+                    loaded.bloom.merge(BloomFilter(pending[0]))
+                    loaded.hll.merge(HyperLogLog(pending[1]))
+                    loaded.dirty = True
+                # Another thread may have loaded it meanwhile; keep theirs
+                sketch = self._sketches.setdefault(post_id, loaded)
+                self._sketches.move_to_end(post_id)
+                while len(self._sketches) > self.max_posts:
+                    evicted_id, old = self._sketches.popitem(last=False)
+                    if old.dirty:
+                        evicted[evicted_id] = (bytes(old.bloom.bits), bytes(old.hll.registers))
+                self._evicting.update(evicted)
+        if evicted:
+            with self._io_lock:
+                try:
+                    self._persist(evicted)
+                except Exception:
+                    # Don't fail the request that happened to trigger the eviction
+                    logger.exception("Could not persist evicted like sketches")
+                finally:
+                    with self._lock:
+                        for evicted_id, snapshot in evicted.items():
+                            if self._evicting.get(evicted_id) is snapshot:
+                                del self._evicting[evicted_id]
+        return sketch
+
+    def add_if_absent(self, post_id: int, liker: str) -> bool:
+        """Record a like by `liker`; False if they (probably) liked `post_id` already.
+
+        The check and the insert happen under one lock, so concurrent repeats
+        from the same liker can't both get through. Posts past BLOOM_CAPACITY
+        likers always return True.
+        """
+        digest = _digest(liker)
+        while True:
+            sketch = self._get(post_id)
+            with self._lock:
+                # Retry if it was evicted between _get and here
+                if self._sketches.get(post_id) is not sketch:
+                    continue
+                if not sketch.saturated and digest in sketch.bloom:
+                    return False
+                sketch.bloom.add(digest)
+                sketch.hll.add(digest)
+                sketch.dirty = True
+                sketch.update_saturation()
+                return True
+
+    def unique_likers(self, post_id: int) -> int:
+        sketch = self._get(post_id)
+        with self._lock:
+            return sketch.hll.count()
+
+    def forget(self, post_id: int):
+        with self._io_lock:
+            with self._lock:
+                self._sketches.pop(post_id, None)
+                self._evicting.pop(post_id, None)
+            with SessionLocal() as db:
+                db.query(LikeSketch).filter(LikeSketch.post_id == post_id).delete()
+                db.commit()
+
+    def _persist(self, snapshots):
+        """Merge {post_id: (bloom bytes, hll bytes)} into the stored rows (other workers may have written too).
+
+        Returns the merged sketches.
+        """
+        merged = {}
+        with SessionLocal() as db:
+            rows = {
+                row.post_id: row
+                for row in db.query(LikeSketch).filter(LikeSketch.post_id.in_(list(snapshots)))
+            }
+            for post_id, (bloom_bits, hll_registers) in snapshots.items():
+                bloom, hll = BloomFilter(bloom_bits), HyperLogLog(hll_registers)
+                row = rows.get(post_id)
+                if row is None:
+                    row = LikeSketch(post_id=post_id)
+                    db.add(row)
+                else:
+                    bloom.merge(BloomFilter(row.bloom))
+                    hll.merge(HyperLogLog(row.hll))
+                row.bloom = bytes(bloom.bits)
+                row.hll = bytes(hll.registers)
+                merged[post_id] = (bloom, hll)
+            db.commit()
+        return merged
+
+    def flush(self):
+        # Under _io_lock so a concurrent reload can't read the rows mid-write
+        with self._io_lock:
+            with self._lock:
+                snapshots = {}
+                for post_id, sketch in self._sketches.items():
+                    if sketch.dirty:
+                        snapshots[post_id] = (bytes(sketch.bloom.bits), bytes(sketch.hll.registers))
+                        sketch.dirty = False
+            if not snapshots:
+                return
+            try:
+                merged = self._persist(snapshots)
+            except Exception:
+                with self._lock:
+                    for post_id in snapshots:
+                        sketch = self._sketches.get(post_id)
+                        if sketch is not None:
+                            sketch.dirty = True
+                raise
+        # Pick up likes other workers have persisted
+        with self._lock:
+            for post_id, (bloom, hll) in merged.items():
+                sketch = self._sketches.get(post_id)
+                if sketch is not None:
+                    sketch.bloom.merge(bloom)
+                    sketch.hll.merge(hll)
+                    sketch.update_saturation()
+
+    def _run(self):
+        while not self._stop.wait(FLUSH_INTERVAL_SECONDS):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not persist like sketches")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="like-sketch-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+tracker = LikeTracker()
+
+
+def liker_key(user_subject: Optional[str], client_ip: str, user_agent: str) -> str:
+    if user_subject:
+        return f"user:{user_subject}"
+    return "anon:" + hashlib.sha256(f"{client_ip}|{user_agent}".encode()).hexdigest()
@@ -0,0 +1,120 @@
+"""
+Cache-friendly serving for /uploads.
+
+New uploads are stored under a content hash, so their URLs never change
+meaning and can be cached as immutable. Every file gets a strong, content-
+derived ETag (304 on If-None-Match), range requests are handled by Starlette's
+FileResponse, and `<name>.br` / `<name>.gz` siblings are served to clients
+that accept them.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from collections import Counter
+from typing import Dict, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+from compression import accepts_encoding
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+# Filenames produced by content_addressed_name(): 32 hex chars + extension
+HASHED_NAME = re.compile(r"^([0-9a-f]{32})\.[A-Za-z0-9]+$")
+
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+# Outcome counters, reported by /health
+upload_cache_stats: Counter = Counter()
+
+_etag_cache: Dict[Tuple[str, int, int], str] = {}
+
+
+def content_addressed_name(content: bytes, extension: str) -> str:
+    """Filename for an upload derived from its bytes (identical uploads share a file)."""
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    if not extension.isalnum():
+        extension = "jpg"
+    return f"{digest}.{extension.lower()}"
+
+
+def _file_etag(path: str, stat_result: os.stat_result) -> str:
+    name = os.path.basename(path)
+    match = HASHED_NAME.match(name)
+    if match:
+        return f'"{match.group(1)}"'
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    etag = _etag_cache.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        _etag_cache[key] = etag
+    return etag
+
+
+def _accepts(request_headers: Headers, encoding: str) -> bool:
+    accepted = request_headers.get("accept-encoding", "")
+    return accepts_encoding(accepted.encode("latin-1"), encoding.encode())
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with long-lived Cache-Control, strong ETags and precompressed variants."""
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        path = str(full_path)
+        name = os.path.basename(path)
+        etag = _file_etag(path, stat_result)
+        headers = {
+            "cache-control": IMMUTABLE_CACHE_CONTROL if HASHED_NAME.match(name) else DEFAULT_CACHE_CONTROL,
+            "vary": "Accept-Encoding",
+        }
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+        # Precompressed siblings are only used for whole-file requests
+        if "range" not in request_headers:
+            for encoding, suffix in PRECOMPRESSED:
+                variant = path + suffix
+                if _accepts(request_headers, encoding) and os.path.isfile(variant):
+                    headers["etag"] = f'{etag[:-1]}-{suffix[1:]}"'
+                    headers["content-encoding"] = encoding
+                    response = FileResponse(
+                        variant,
+                        status_code=status_code,
+                        headers=headers,
+                        media_type=media_type,
+                        stat_result=os.stat(variant),
+                    )
+                    return self._finish(response, request_headers, name, f"precompressed-{encoding}")
+
+        headers["etag"] = etag
+        response = FileResponse(
+            path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result
+        )
+        outcome = "range" if "range" in request_headers else "full"
+        return self._finish(response, request_headers, name, outcome)
+
+    def _finish(self, response: FileResponse, request_headers: Headers, name: str, outcome: str) -> Response:
+        if self.is_not_modified(response.headers, request_headers):
+            outcome = "not_modified"
+            response = NotModifiedResponse(response.headers)
+        upload_cache_stats[outcome] += 1
+        logger.debug("uploads %s %s", outcome, name)
+        return response
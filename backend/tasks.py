@@ -0,0 +1,64 @@
+"""
+Background job handlers. Request handlers enqueue these through jobs.enqueue()
+and return without waiting for them.
+"""
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+
+from compression import brotli, compress
+from jobs import job
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+MAIL_FROM = os.getenv("MAIL_FROM", "WanderLuxe Ventures <no-reply@wanderluxe.live>")
+
+# Upload types worth keeping .gz/.br siblings for (see static_files.PRECOMPRESSED)
+PRECOMPRESS_EXTENSIONS = {"svg"}
+
+
+@job("send_appointment_confirmation")
+def send_appointment_confirmation(email: str, full_name: str, appointment_date: str, appointment_time: str):
+    """Email the customer that their booking request was received"""
+    if not SMTP_HOST:
+        logger.info("SMTP_HOST not set; skipping confirmation email to %s", email)
+        return
+
+    message = EmailMessage()
+    message["Subject"] = "Your WanderLuxe appointment request"
+    message["From"] = MAIL_FROM
+    message["To"] = email
+    message.set_content(
+        f"Hi {full_name},\n\n"
+        f"We received your appointment request for {appointment_date} at {appointment_time}. "
+        "Our team will be in touch to confirm shortly.\n\n"
+        "WanderLuxe Ventures"
+    )
+    # Errors propagate so the queue retries with backoff
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as smtp:
+        smtp.starttls()
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+        smtp.send_message(message)
+
+
+@job("process_upload")
+def process_upload(path: str):
+    """Write precompressed siblings for compressible uploads"""
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension not in PRECOMPRESS_EXTENSIONS or not os.path.isfile(path):
+        return
+    with open(path, "rb") as f:
+        content = f.read()
+    encodings = [("gzip", ".gz")] + ([("br", ".br")] if brotli is not None else [])
+    for encoding, suffix in encodings:
+        variant = path + suffix
+        # Write then rename so the static handler never sees a partial file
+        with open(variant + ".tmp", "wb") as f:
+            f.write(compress(content, encoding))
+        os.replace(variant + ".tmp", variant)
@@ -25,6 +25,10 @@ const LikeButton = ({ postId, initialLikes = 0, size = 'sm', showCount = true })
       setLikes(updatedPost.likes);
       setIsLiked(true);
     } catch (error) {
+      if (error.message === 'You already liked this post') {
+        setIsLiked(true);
+        return;
+      }
       console.error('Error liking post:', error);
       alert('Failed to like post. Please try again.');
     } finally {
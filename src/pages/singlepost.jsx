@@ -299,7 +299,7 @@ function SinglePost() {
                 animate={{ opacity: 1 }}
                 transition={{ delay: 0.4, duration: 0.5 }}
                 className="px-2 text-justify leading-relaxed prose prose-lg max-w-none"
-                dangerouslySetInnerHTML={{ __html: post.content.replace(/\n/g, '<br />') }}
+                dangerouslySetInnerHTML={{ __html: post.content_html || post.content.replace(/\n/g, '<br />') }}
               />
 
               {/* Engagement Section */}